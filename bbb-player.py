@@ -1,35 +1,98 @@
 import argparse
 from urllib.parse import urlparse
 import os
-import urllib.request
+import shutil
 import json
-from distutils.dir_util import copy_tree
 import traceback
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta
 import logging
+import urllib3
 
 
 LOGGING_LEVEL = logging.INFO
 # LOGGING_LEVEL = logging.DEBUG
+# Set to True only when running behind Apache or lighttpd with X-Sendfile support (see README).
+# It applies to every file the app serves, not only recordings.
+USE_X_SENDFILE = False
 DOWNLOADED_FULLY_FILENAME = "rec_fully_downloaded.txt"
 DOWNLOADED_MEETINGS_FOLDER = "downloadedMeetings"
+SLIDES_INDEX_FILENAME = ".slides_index.json"
+HTTP_CACHE_FILENAME = ".http_cache.json"
 DEFAULT_COMBINED_VIDEO_NAME = "combine-output"
 COMBINED_VIDEO_FORMAT = "mkv"
+DOWNLOAD_WORKERS = 16
+SERVER_THREADS = 16
+SMARTDL_MIN_SIZE = 32 * 1024 * 1024
+VIDEO_EXTENSIONS = (".webm", ".mp4")
+COPY_BUFFER_SIZE = 1024 * 1024
+# get meeting id from url https://regex101.com/r/UjqGeo/3
+MEETING_URL_REGEX = re.compile(r"/?(\d+\.\d+)/.*?([0-9a-f]{40}-\d{13})/?",
+                               re.IGNORECASE)
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+DOWNLOADED_MEETINGS_PATH = os.path.join(SCRIPT_DIR, DOWNLOADED_MEETINGS_FOLDER)
+PLAYER23_PATH = os.path.join(SCRIPT_DIR, "player23")
 
 logging.basicConfig(format="[%(asctime)s -%(levelname)8s]: %(message)s",
                     datefmt="%H:%M:%S",
                     level=LOGGING_LEVEL)
 logger = logging.getLogger('bbb-player')
 
+# A bigger copy buffer means fewer read/write syscalls when copying the player and downloads
+shutil.COPY_BUFSIZE = COPY_BUFFER_SIZE
+
+# One pool shared by all download threads, so keep-alive connections to the bbb host are reused
+http = urllib3.PoolManager(maxsize=DOWNLOAD_WORKERS * 2, block=False,
+                           retries=urllib3.Retry(3, backoff_factor=0.3))
+
+# Set when the app stops, so downloads still queued in the thread pool are skipped
+shutdownEvent = threading.Event()
+
 try:
     from pySmartDL import SmartDL
     smartDlEnabled = True
 except ImportError:
-    logger.warning("pySmartDL not imported, using urllib instead")
+    logger.warning(
+        "pySmartDL not imported, large videos will be downloaded with urllib3 instead")
     smartDlEnabled = False
 
+try:
+    from progressist import ProgressBar
+    progressBarEnabled = True
+except ImportError:
+    logger.warning("progressist not imported. Progress bar will not be shown. Try running: \
+                        pip3 install progressist")
+    progressBarEnabled = False
+
+try:
+    # orjson parses large presentation_text.json files several times faster
+    from orjson import loads as jsonLoads
+except ImportError:
+    logger.debug("orjson not imported, using json instead")
+    from json import loads as jsonLoads
+
+# Created on first use and shared by later downloads, but shown by one download at a time
+progressBar = None
+progressBarLock = threading.Lock()
+
+
+def acquireProgressBar():
+    # Returns the bar, or None when progressist is missing or another download is using it
+    global progressBar
+    if not progressBarEnabled or not progressBarLock.acquire(blocking=False):
+        return None
+    if progressBar is None:
+        progressBar = ProgressBar(throttle=timedelta(seconds=1),
+                                  template="Download |{animation}|{tta}| {done}/{total} files")
+    return progressBar
+
+
+def releaseProgressBar(bar):
+    if bar:
+        progressBarLock.release()
+
 
 def ffmpegCombine(suffix, fileName=DEFAULT_COMBINED_VIDEO_NAME):
     try:
@@ -51,108 +114,282 @@ def ffmpegCombine(suffix, fileName=DEFAULT_COMBINED_VIDEO_NAME):
     ffmpeg.run(output)
 
 
-def downloadFiles(baseURL, basePath):
+def httpGet(downloadURL, savePath, headers=None):
+    # Stream the body to disk over the shared connection pool instead of opening a new connection per file
+    r = http.request('GET', downloadURL, headers=headers,
+                     preload_content=False)
+    try:
+        if r.status == 200:
+            # Write to a temporary file first so an interrupted download never looks complete
+            partPath = savePath + '.part'
+            with open(partPath, 'wb', buffering=COPY_BUFFER_SIZE) as f:
+                shutil.copyfileobj(r, f, length=COPY_BUFFER_SIZE)
+            os.replace(partPath, savePath)
+        else:
+            # Read the error page, otherwise it is parsed as the next response on this connection
+            r.drain_conn()
+    except BaseException:
+        # The body was only partly read, so the connection can't be reused
+        r.close()
+        raise
+    finally:
+        r.release_conn()
+
+    # ETag and Last-Modified let a retry ask the server whether the file changed
+    validators = {name: r.headers[name]
+                  for name in ('ETag', 'Last-Modified') if name in r.headers}
+    return r.status, validators
+
+
+def conditionalHeaders(validators):
+    headers = {}
+    if 'ETag' in validators:
+        headers['If-None-Match'] = validators['ETag']
+    if 'Last-Modified' in validators:
+        headers['If-Modified-Since'] = validators['Last-Modified']
+    return headers
+
+
+def loadHttpCache(httpCachePath):
+    try:
+        with open(httpCachePath, 'rb') as f:
+            return jsonLoads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def logDownloadError(downloadURL, status):
+    if status == 404:
+        logger.warning(
+            f"Did not download {downloadURL} because of 404 error")
+    else:
+        logger.warning(
+            f"Did not download {downloadURL} because of HTTP {status} error")
+
+
+def probeFile(urlAndPath):
+    # HEAD is enough to learn whether a file exists and how big it is
+    if shutdownEvent.is_set():
+        return None, 0
+    try:
+        r = http.request('HEAD', urlAndPath[0])
+        return r.status, int(r.headers.get('Content-Length', 0))
+    except urllib3.exceptions.HTTPError as e:
+        logger.warning(f"Could not check {urlAndPath[0]}: {e}")
+    except Exception:
+        logger.exception("")
+    return None, 0
+
+
+def fetchLargeFile(urlAndPath):
+    downloadURL, savePath = urlAndPath
+    logger.info(f"Downloading {downloadURL} with SmartDL")
+    try:
+        smartDl = SmartDL(downloadURL, savePath)
+        smartDl.start()
+    except Exception:
+        logger.exception("")
+
+
+def fetchFile(urlAndPath, headers=None):
+    # returns the validators of a successful download, or None
+    downloadURL, savePath = urlAndPath
+    if shutdownEvent.is_set():
+        return None
+    logger.debug(f"Download url:\t{downloadURL}")
+    logger.debug(f"Download path:\t{savePath}")
+
+    try:
+        status, validators = httpGet(downloadURL, savePath, headers=headers)
+        if status == 200:
+            return validators
+        if status == 304:
+            logger.debug(f"{downloadURL} not modified")
+        else:
+            logDownloadError(downloadURL, status)
+    except urllib3.exceptions.HTTPError as e:
+        # connection errors that are left after urllib3's retries
+        logger.warning(f"Did not download {downloadURL}: {e}")
+    except Exception:
+        logger.exception("")
+    return None
+
+
+def isDownloaded(savePath):
+    return os.path.exists(savePath) and os.path.getsize(savePath) > 0
+
+
+def cancelFutures(futures):
+    # Drop queued requests so stopping the app only waits for the ones already in flight
+    for future in futures:
+        future.cancel()
+
+
+def fetchAll(urls, probe=False, bar=None, httpCachePath=None):
+    httpCache = loadHttpCache(httpCachePath) if httpCachePath else {}
+
+    # Files that are already on disk from a previous attempt are not fetched again,
+    # unless their validators are cached, in which case a conditional GET checks them.
+    # Videos are never revalidated: a server ignoring the validators would resend the whole video.
+    missing = []
+    revalidate = []
+    for url, savePath in urls:
+        if not isDownloaded(savePath):
+            missing.append((url, savePath))
+        elif url in httpCache and not url.endswith(VIDEO_EXTENSIONS):
+            revalidate.append((url, savePath))
+    skipped = len(urls) - len(missing) - len(revalidate)
+    if skipped:
+        logger.info(f"{skipped} of {len(urls)} files already downloaded")
+    if revalidate:
+        logger.info(f"Checking {len(revalidate)} downloaded files for changes")
+    urls = missing
+    largeUrls = []
+
+    # Downloads are I/O bound, so running them concurrently hides the per-file round trip
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as ex:
+        if probe:
+            # Cheap concurrent HEADs first, so missing variants (e.g. webm vs mp4) don't cost a GET
+            present = []
+            probes = [ex.submit(probeFile, urlAndPath) for urlAndPath in urls]
+            for urlAndPath, probeFuture in zip(urls, probes):
+                if shutdownEvent.is_set():
+                    cancelFutures(probes)
+                    return
+                status, size = probeFuture.result()
+                # Only a missing file is dropped here, other HEAD errors (e.g. a server
+                # rejecting HEAD) are left to the GET
+                if status in (404, 410):
+                    logDownloadError(urlAndPath[0], status)
+                elif (smartDlEnabled and status == 200 and size > SMARTDL_MIN_SIZE
+                        and urlAndPath[0].endswith(VIDEO_EXTENSIONS)):
+                    # Only videos can be big enough for SmartDL's segmented download to pay off
+                    largeUrls.append(urlAndPath)
+                else:
+                    present.append(urlAndPath)
+            urls = present
+
+        # Create every destination folder up front so worker threads don't race on os.makedirs
+        for folder in {os.path.dirname(savePath) for _, savePath in urls + largeUrls}:
+            createFolder(folder)
+
+        if bar and (urls or revalidate):
+            # reset the bar for this batch, this download holds it until it finishes
+            bar.update(step=0, done=0, total=len(urls) + len(revalidate),
+                       start=None)
+        else:
+            bar = None
+        futures = {}
+        for urlAndPath in urls:
+            futures[ex.submit(fetchFile, urlAndPath)] = urlAndPath[0]
+        for urlAndPath in revalidate:
+            headers = conditionalHeaders(httpCache[urlAndPath[0]])
+            futures[ex.submit(fetchFile, urlAndPath, headers)] = urlAndPath[0]
+        try:
+            for future in as_completed(futures):
+                if shutdownEvent.is_set():
+                    cancelFutures(futures)
+                    break
+                validators = future.result()
+                if validators and not futures[future].endswith(VIDEO_EXTENSIONS):
+                    httpCache[futures[future]] = validators
+                if bar:
+                    bar.update()
+        finally:
+            if httpCachePath:
+                with open(httpCachePath, 'w', encoding="utf8") as f:
+                    json.dump(httpCache, f)
+
+    # SmartDL splits big videos into segments with its own threads, so run it outside the pool
+    for urlAndPath in largeUrls:
+        if shutdownEvent.is_set():
+            return
+        fetchLargeFile(urlAndPath)
+
+
+def downloadFiles(baseURL, basePath, bar=None):
     filesForDL = ["captions.json", "cursor.xml", "deskshare.xml", "presentation/deskshare.png", "metadata.xml", "panzooms.xml", "presentation_text.json",
                   "shapes.svg", "slides_new.xml", "video/webcams.webm", "video/webcams.mp4", "deskshare/deskshare.webm", "deskshare/deskshare.mp4"]
 
-    for i, file in enumerate(filesForDL):
-        logger.info(f'[{i+1}/{len(filesForDL)}] Downloading {file}')
-        downloadURL = baseURL + file
-        logger.debug(downloadURL)
-        savePath = os.path.join(basePath, file)
-        logger.debug(savePath)
+    urls = [(baseURL + file, os.path.join(basePath, file))
+            for file in filesForDL]
+    logger.info(f"Downloading {len(urls)} files")
+    fetchAll(urls, probe=True, bar=bar,
+             httpCachePath=os.path.join(basePath, HTTP_CACHE_FILENAME))
 
-        try:
-            if smartDlEnabled:
-                smartDl = SmartDL(downloadURL, savePath)
-                smartDl.start()
-            else:
-                urllib.request.urlretrieve(
-                    downloadURL, savePath, reporthook=bar.on_urlretrieve if bar else None)
-        except urllib.error.HTTPError as e:
-            # traceback.print_exc()
-            if e.code == 404:
-                logger.warning(f"Did not download {file} because of 404 error")
-        except Exception:
-            logger.exception("")
 
+def loadSlidesIndex(basePath):
+    # Number of slides per presentation, kept in a sidecar file so retries skip parsing presentation_text.json
+    jsonPath = os.path.join(basePath, 'presentation_text.json')
+    indexPath = os.path.join(basePath, SLIDES_INDEX_FILENAME)
+    if os.path.isfile(indexPath) and os.path.getmtime(indexPath) >= os.path.getmtime(jsonPath):
+        try:
+            with open(indexPath, 'rb') as f:
+                return jsonLoads(f.read())
+        except (OSError, ValueError):
+            logger.debug(f"Could not read {indexPath}, parsing presentation_text.json again")
 
-def downloadSlides(baseURL, basePath):
     # Part of this is based on https://www.programiz.com/python-programming/json
-    with open(basePath + '/presentation_text.json', encoding="utf8") as f:
-        data = json.load(f)
-        logger.info(f"Downloading {len(data)} presentations")
-        for element in data:
-            logger.debug(element)
-            noSlides = len(data[element])
-            logger.debug(noSlides)
-            createFolder(os.path.join(basePath, 'presentation', element))
-            logger.info(f"Downloading {noSlides} slides for the presentation")
-            for i in range(1, noSlides+1):
-                logger.debug(f"Downloading slide {i}/{noSlides}")
-                downloadURL = baseURL + 'presentation/' + \
-                    element + '/slide-' + str(i) + '.png'
-                savePath = os.path.join(basePath, 'presentation',
-                                        element,  'slide-{}.png'.format(i))
-
-                logger.debug(downloadURL)
-                logger.debug(savePath)
-
-                try:
-                    if smartDlEnabled:
-                        smartDl = SmartDL(
-                            downloadURL, savePath, progress_bar=False)
-                        smartDl.start()
-                    else:
-                        urllib.request.urlretrieve(
-                            downloadURL, savePath, reporthook=bar.on_urlretrieve if bar else None)
-                except urllib.error.HTTPError as e:
-                    # traceback.print_exc()
-                    if e.code == 404:
-                        logger.warning(
-                            f"Did not download {element}/slide-{str(i)}.png")
-                except Exception:
-                    logger.exception("")
-
-            createFolder(os.path.join(
-                basePath, 'presentation', element, 'thumbnails'))
+    with open(jsonPath, 'rb') as f:
+        data = jsonLoads(f.read())
+    slidesIndex = {element: len(data[element]) for element in data}
+    # Write through a temporary file so an interrupted write never leaves a truncated index
+    partPath = indexPath + '.part'
+    with open(partPath, 'w', encoding="utf8") as f:
+        json.dump(slidesIndex, f)
+    os.replace(partPath, indexPath)
+    return slidesIndex
+
+
+def downloadSlides(baseURL, basePath, bar=None):
+    slidesIndex = loadSlidesIndex(basePath)
+
+    logger.info(f"Downloading {len(slidesIndex)} presentations")
+    urls = []
+    for element, noSlides in slidesIndex.items():
+        logger.info(
+            f"Queueing {noSlides} slides and thumbnails for presentation {element}")
+        # only the slide number changes inside the loop
+        slideURL = f"{baseURL}presentation/{element}/slide-"
+        slidePath = os.path.join(basePath, 'presentation', element, 'slide-')
+        thumbURL = f"{baseURL}presentation/{element}/thumbnails/thumb-"
+        thumbPath = os.path.join(
+            basePath, 'presentation', element, 'thumbnails', 'thumb-')
+        for i in range(1, noSlides+1):
+            urls.append((f"{slideURL}{i}.png", f"{slidePath}{i}.png"))
+            urls.append((f"{thumbURL}{i}.png", f"{thumbPath}{i}.png"))
 
-            logger.info(
-                f"Downloading {noSlides} thumbnails for the presentation")
-            for i in range(1, noSlides+1):
-                downloadURL = baseURL + 'presentation/' + \
-                    element + '/thumbnails/thumb-' + str(i) + '.png'
-                savePath = os.path.join(basePath, 'presentation',
-                                        element, 'thumbnails', 'thumb-{}.png'.format(i))
-
-                logger.debug(f"Download url:\t{downloadURL}")
-                logger.debug(f"Download path:\t{savePath}")
-
-                try:
-                    if smartDlEnabled:
-                        smartDl = SmartDL(
-                            downloadURL, savePath, progress_bar=False)
-                        smartDl.start()
-                    else:
-                        urllib.request.urlretrieve(
-                            downloadURL, savePath, reporthook=bar.on_urlretrieve if bar else None)
-                except urllib.error.HTTPError as e:
-                    # traceback.print_exc()
-                    if e.code == 404:
-                        logger.warning(
-                            f"Did not download {element}/slide-{str(i)}.png")
-                except Exception:
-                    logger.exception("")
+    fetchAll(urls, bar=bar)
 
 
 def createFolder(path):
-    # Create meeting folders, based on https://stackabuse.com/creating-and-deleting-directories-with-python/
-    try:
-        os.makedirs(path)
-    except OSError:
-        logger.debug("Creation of the directory %s failed" % path)
-    else:
-        logger.debug("Successfully created the directory %s " % path)
+    # Create meeting folders, behaves like mkdir -p
+    os.makedirs(path, exist_ok=True)
+
+
+def isBbb23(path):
+    # bbb 2.3 has index.html and asset-manifest.json; one directory scan instead of a stat per file
+    with os.scandir(path) as it:
+        names = {entry.name for entry in it}
+    return 'index.html' in names and 'asset-manifest.json' in names
+
+
+# Listing of downloadedMeetings, rebuilt only when the folder changes or a meeting is downloaded
+meetingCache = {"mtime": None, "entries": []}
+
+
+def listMeetings(folderPath):
+    # returns sorted [name, hasPlayer23] pairs for every meeting folder
+    mtime = os.stat(folderPath).st_mtime_ns
+    if meetingCache["mtime"] != mtime:
+        entries = []
+        with os.scandir(folderPath) as it:
+            for entry in it:
+                if entry.is_dir():
+                    entries.append([entry.name, isBbb23(entry.path)])
+        meetingCache["entries"] = sorted(entries)
+        meetingCache["mtime"] = mtime
+    return meetingCache["entries"]
 
 
 def create_app():
@@ -164,29 +401,22 @@ def create_app():
 
     logger.debug("Flask imported.")
 
-    downloadedMeetingsFolderPath = os.path.join(SCRIPT_DIR, DOWNLOADED_MEETINGS_FOLDER)
-    if not os.path.isdir(downloadedMeetingsFolderPath):
+    if not os.path.isdir(DOWNLOADED_MEETINGS_PATH):
         logger.error(f"Meetings folder is not present. Download at least one meeting first using the --download argument")
         exit(1)
 
     logger.debug(f"Current path: {os.getcwd()}")
 
     # check if an older bbb version recording exists and copy 2.3 player to it:
-    meetingFolders = sorted([folder for folder in os.listdir(
-        downloadedMeetingsFolderPath) if os.path.isdir(os.path.join(downloadedMeetingsFolderPath, folder))])
-    for m in meetingFolders:
-        # get links to correct html files in folders of downloaded meetings
-        if (os.path.isfile(os.path.join(downloadedMeetingsFolderPath, m, 'index.html'))
-                and os.path.isfile(os.path.join(downloadedMeetingsFolderPath, m, 'asset-manifest.json'))):
-            # bbb 2.3 has index.html
-            pass
-        else:
+    for m, hasPlayer23 in listMeetings(DOWNLOADED_MEETINGS_PATH):
+        if not hasPlayer23:
             # bbb 2.0 - copy bbb 2.3 player over it
             logger.info(
                 f"An older 2.0 bbb player detected in meeting {m}. Copying 2.3 player over it")
-            player23Folder = os.path.join(SCRIPT_DIR, "player23")
-            meetingFolder = os.path.join(downloadedMeetingsFolderPath, m)
-            copy_tree(player23Folder, meetingFolder)
+            meetingFolder = os.path.join(DOWNLOADED_MEETINGS_PATH, m)
+            shutil.copytree(PLAYER23_PATH, meetingFolder,
+                            dirs_exist_ok=True, copy_function=shutil.copy2)
+            meetingCache["mtime"] = None
 
     # Based on https://stackoverflow.com/a/42791810
     # Flask is needed for HTTP 206 Partial Content support.
@@ -203,6 +433,8 @@ def create_app():
             url = form["meeting-url"].strip()
 
             downloadScript(url, name)
+            # the meeting folder may have changed without touching downloadedMeetings itself
+            meetingCache["mtime"] = None
 
             message = " دانلود جلسه " + name + " ناموفق بود، لطفا مجددا تلاش نمایید."
 
@@ -218,15 +450,14 @@ def create_app():
     @app.route("/", methods=["GET"])
     def hello(message='لطفا لینک و نام جلسه مورد نظر را جهت دانلود وارد نمایید.'):
         # list all folders in DOWNLOADED_MEETINGS_FOLDER
-        meetingFolders = sorted([folder for folder in os.listdir(
-            downloadedMeetingsFolderPath) if os.path.isdir(os.path.join(downloadedMeetingsFolderPath, folder))])
+        meetingFolders = listMeetings(DOWNLOADED_MEETINGS_PATH)
         if len(meetingFolders) == 0:
             logger.warning(
                 f"Meeting folder /{DOWNLOADED_MEETINGS_FOLDER} is empty. Download at least one meeting first using the --download argument")
         meetingLinks = []
-        for m in meetingFolders:
+        for m, hasPlayer23 in meetingFolders:
             # get links to correct html files in folders of downloaded meetings
-            if (os.path.isfile(os.path.join(downloadedMeetingsFolderPath, m, 'index.html')) and os.path.isfile(os.path.join(downloadedMeetingsFolderPath, m, 'asset-manifest.json'))):
+            if hasPlayer23:
                 # bbb 2.3 has index.html
                 meetingLinks.append(
                     [f"/{DOWNLOADED_MEETINGS_FOLDER}/{m}/index.html", m])
@@ -241,16 +472,14 @@ def create_app():
     # Based on https://stackoverflow.com/a/37331139
     # This is needed for playback of multiple meetings in short succession.
     app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+    app.config['USE_X_SENDFILE'] = USE_X_SENDFILE
     app.config['TESTING'] = True
 
     return app
 
 
 def downloadScript(inputURL, meetingNameWanted):
-    # get meeting id from url https://regex101.com/r/UjqGeo/3
-    matchesURL = re.search(r"/?(\d+\.\d+)/.*?([0-9a-f]{40}-\d{13})/?",
-                           inputURL,
-                           re.IGNORECASE)
+    matchesURL = MEETING_URL_REGEX.search(inputURL)
     if matchesURL and len(matchesURL.groups()) == 2:
         bbbVersion = matchesURL.group(1)
         meetingId = matchesURL.group(2)
@@ -260,17 +489,14 @@ def downloadScript(inputURL, meetingNameWanted):
         logger.error("Meeting ID could not be found in the url.")
         exit(1)
 
-    baseURL = "{}://{}/presentation/{}/".format(urlparse(inputURL).scheme,
-                                                urlparse(inputURL).netloc,
-                                                meetingId)
+    parsedURL = urlparse(inputURL)
+    baseURL = f"{parsedURL.scheme}://{parsedURL.netloc}/presentation/{meetingId}/"
     logger.debug("Base url: {}".format(baseURL))
 
     if meetingNameWanted:
-        folderPath = os.path.join(
-            SCRIPT_DIR, DOWNLOADED_MEETINGS_FOLDER, meetingNameWanted)
+        folderPath = os.path.join(DOWNLOADED_MEETINGS_PATH, meetingNameWanted)
     else:
-        folderPath = os.path.join(
-            SCRIPT_DIR, DOWNLOADED_MEETINGS_FOLDER, meetingId)
+        folderPath = os.path.join(DOWNLOADED_MEETINGS_PATH, meetingId)
     logger.debug("Folder path: {}".format(folderPath))
 
     if os.path.isfile(os.path.join(folderPath, DOWNLOADED_FULLY_FILENAME)):
@@ -280,26 +506,23 @@ def downloadScript(inputURL, meetingNameWanted):
             "Folder already created but not everything was downloaded. Retrying.")
         # todo: maybe delete contents of the folder
 
-        foldersToCreate = [os.path.join(folderPath, x) for x in [
-            "", "video", "deskshare", "presentation"]]
-        # logger.info(foldersToCreate)
-        for i in foldersToCreate:
-            createFolder(i)
+        # video, deskshare and presentation folders are created by fetchAll from the download list
+        createFolder(folderPath)
 
+        bar = acquireProgressBar()
         try:
-            from progressist import ProgressBar
-            bar = ProgressBar(throttle=timedelta(seconds=1),
-                              template="Download |{animation}|{tta}| {done:B}/{total:B} at {speed:B}/s")
-        except:
-            logger.warning("progressist not imported. Progress bar will not be shown. Try running: \
-                                pip3 install progressist")
-            bar = None
-
-        downloadFiles(baseURL, folderPath)
-        downloadSlides(baseURL, folderPath)
+            downloadFiles(baseURL, folderPath, bar=bar)
+            if not shutdownEvent.is_set():
+                downloadSlides(baseURL, folderPath, bar=bar)
+        finally:
+            releaseProgressBar(bar)
+        if shutdownEvent.is_set():
+            # the app is stopping, leave the meeting unmarked so the next run retries it
+            return
 
         # Copy the 2.3 player
-        copy_tree(os.path.join(SCRIPT_DIR, "player23"), folderPath)
+        shutil.copytree(PLAYER23_PATH, folderPath,
+                        dirs_exist_ok=True, copy_function=shutil.copy2)
 
         with open(os.path.join(folderPath, DOWNLOADED_FULLY_FILENAME), 'w') as fp:
             # write a downloaded_fully file to mark a successful download
@@ -315,5 +538,21 @@ if __name__ == "__main__":
     logger.info('http://localhost:5000')
     logger.info('Press CTRL+C to stop app.')
     logger.info('---------')
-    app.run(host='0.0.0.0', port=5000)
+    # waitress is a production WSGI server, used when installed; the Flask
+    # development server is kept as a fallback
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.debug("waitress not imported, using the Flask server instead")
+        serve = None
+    try:
+        if serve:
+            serve(app, host='0.0.0.0', port=5000, threads=SERVER_THREADS)
+        else:
+            app.run(host='0.0.0.0', port=5000)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # downloads run in request threads, which never see CTRL+C themselves
+        shutdownEvent.set()
 